@@ -1,18 +1,24 @@
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
-from utils import MANIPULATION_TYPES, get_all_manipulation_types, detect_matches
-import matplotlib.pyplot as plt
-import seaborn as sns
+from utils import MANIPULATION_TYPES, IMAGE_EXTS, get_all_manipulation_types, load_phashes, hash_score
 
-def save_visualization(df, output_path):
-    manipulation_types = [col for col in df.columns if col not in ['image_id', 'method', 'avg_score']]
+def save_visualization(df, output_path, manipulation_types):
+    # Imported here so pool workers and --no-viz runs don't pay for matplotlib/seaborn
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    # Materialize the score columns once; all three plots read from this matrix
+    mat = df[manipulation_types].to_numpy()
     
     # 1. Bar chart of average match scores
-    avg_scores = df[manipulation_types].mean().sort_values()
+    avg_scores = mat.mean(axis=0)
+    order = np.argsort(avg_scores)
     plt.figure(figsize=(10,6))
-    sns.barplot(x=avg_scores.index, y=avg_scores.values, palette='viridis')
+    sns.barplot(x=[manipulation_types[i] for i in order], y=avg_scores[order], palette='viridis')
     plt.ylabel("Average Similarity Score")
     plt.title("Average pHash Similarity by Manipulation Type")
     plt.xticks(rotation=45)
@@ -22,7 +28,7 @@ def save_visualization(df, output_path):
     
     # 2. Heatmap of scores per image
     plt.figure(figsize=(12,8))
-    sns.heatmap(df[manipulation_types], cmap='viridis', annot=False)
+    sns.heatmap(mat, cmap='viridis', annot=False, xticklabels=manipulation_types)
     plt.ylabel("Image Index")
     plt.xlabel("Manipulation Type")
     plt.title("pHash Similarity Heatmap (Images x Manipulations)")
@@ -32,53 +38,76 @@ def save_visualization(df, output_path):
     
     # 3. Boxplot of score distribution per manipulation
     plt.figure(figsize=(12,6))
-    sns.boxplot(data=df[manipulation_types], palette='magma')
+    sns.boxplot(data=mat, palette='magma')
     plt.ylabel("Similarity Score")
     plt.title("pHash Score Distribution per Manipulation Type")
-    plt.xticks(rotation=45)
+    plt.xticks(range(len(manipulation_types)), manipulation_types, rotation=45)
     plt.tight_layout()
     plt.savefig(os.path.join(output_path, "scores_boxplot.png"))
     plt.close()
 
+def _hash_one(orig_file, manip_files, originals_dir, manipulated_dir):
+    # Worker for the process pool: hash an original and its manipulations in one batch; scoring happens in bulk in main
+    # manip_files has one entry per manipulation type, None where the file is missing
+    image_id = os.path.splitext(orig_file)[0]
+    paths = [os.path.join(originals_dir, orig_file)]
+    paths += [os.path.join(manipulated_dir, f) if f is not None else None for f in manip_files]
+    hashes, found = load_phashes(paths)
+    if not found[0]:
+        return image_id, np.uint64(0), hashes[1:], np.zeros(len(MANIPULATION_TYPES), dtype=bool)
+    return image_id, hashes[0], hashes[1:], found[1:]
+
 def main():
     parser = argparse.ArgumentParser(description='Detect image matches using pHash')
     parser.add_argument('--originals', type=str, default='originals', help='Path to original images')
     parser.add_argument('--manipulated', type=str, default='manipulated', help='Path to manipulated images')
     parser.add_argument('--output', type=str, default='results', help='Path to output directory')
+    parser.add_argument('--no-viz', action='store_true', help='Skip writing the visualization PNGs')
     args = parser.parse_args()
     
     os.makedirs(args.output, exist_ok=True)
     
-    original_files = sorted([f for f in os.listdir(args.originals) if f.lower().endswith(('.jpg','.jpeg','.png'))])
+    original_files = sorted([e.name for e in os.scandir(args.originals) if e.is_file() and e.name.lower().endswith(IMAGE_EXTS)])
+    # One directory scan instead of a stat() per (image, manipulation) pair
+    manip_names = frozenset()
+    if os.path.isdir(args.manipulated):
+        manip_names = frozenset(e.name for e in os.scandir(args.manipulated) if e.is_file())
     manipulation_types = get_all_manipulation_types()
     
-    results = {manip_name: [] for manip_name in manipulation_types}
-    results['image_id'] = []
+    n_images, n_manips = len(original_files), len(MANIPULATION_TYPES)
+    image_ids = []
+    orig_hashes = np.zeros(n_images, dtype=np.uint64)
+    manip_hashes = np.zeros((n_images, n_manips), dtype=np.uint64)
+    mask = np.zeros((n_images, n_manips), dtype=bool)
+    
+    manip_files = []
+    for orig_file in original_files:
+        image_id = os.path.splitext(orig_file)[0]
+        names = [f"{image_id}{letter}.jpg" for letter in MANIPULATION_TYPES]
+        manip_files.append([name if name in manip_names else None for name in names])
     
     print(f"Processing {len(original_files)} images with pHash...")
     
-    for orig_file in tqdm(original_files):
-        orig_path = os.path.join(args.originals, orig_file)
-        image_id = os.path.splitext(orig_file)[0]
-        results['image_id'].append(image_id)
-        
-        for letter, manip_name in MANIPULATION_TYPES.items():
-            manip_file = f"{image_id}{letter}.jpg"
-            manip_path = os.path.join(args.manipulated, manip_file)
-            
-            if not os.path.exists(manip_path):
-                results[manip_name].append(0)
-                continue
-            
-            score = detect_matches(orig_path, manip_path, method='phash')
-            results[manip_name].append(score)
-    
-    df = pd.DataFrame(results)
+    worker = partial(_hash_one, originals_dir=args.originals, manipulated_dir=args.manipulated)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        hashed = executor.map(worker, original_files, manip_files, chunksize=8)
+        for i, (image_id, orig_hash, row_hashes, row_found) in enumerate(tqdm(hashed, total=n_images)):
+            image_ids.append(image_id)
+            orig_hashes[i] = orig_hash
+            manip_hashes[i] = row_hashes
+            mask[i] = row_found
+    
+    # Score the whole images x manipulations matrix in one broadcast, into a preallocated dense matrix
+    scores = np.zeros((n_images, n_manips), dtype=np.float32)
+    np.copyto(scores, hash_score(orig_hashes[:, None], manip_hashes), where=mask, casting='same_kind')
+    
+    df = pd.DataFrame(scores, columns=manipulation_types)
+    df.insert(0, 'image_id', image_ids)
     df['method'] = 'phash'
-    df['avg_score'] = df[manipulation_types].mean(axis=1)
+    df['avg_score'] = scores.mean(axis=1)
     
     # Average scores and hardest manipulation
-    avg_scores = {manip_name: df[manip_name].mean() for manip_name in manipulation_types}
+    avg_scores = dict(zip(manipulation_types, scores.mean(axis=0).tolist()))
     hardest_manip = min(avg_scores, key=avg_scores.get)
     hardest_score = avg_scores[hardest_manip]
     
@@ -100,7 +129,8 @@ def main():
         f.write("="*50 + "\n")
     
     # Visualization
-    save_visualization(df, args.output)
+    if not args.no_viz:
+        save_visualization(df, args.output, manipulation_types)
     
     # Print summary
     print("\n" + "="*60)
@@ -115,7 +145,8 @@ def main():
     
     print(f"\nResults saved to: {results_file}")
     print(f"Summary saved to: {summary_file}")
-    print(f"Visualizations saved to: {args.output}")
+    if not args.no_viz:
+        print(f"Visualizations saved to: {args.output}")
 
 if __name__ == "__main__":
     main()
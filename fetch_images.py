@@ -1,4 +1,6 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import requests
 from PIL import Image
 from io import BytesIO
@@ -15,6 +17,19 @@ if not PIXABAY_API_KEY:
 SEARCH_QUERY = "art"  # You can change this to different search terms
 IMAGES_TO_DOWNLOAD = 600
 ORIGINALS_FOLDER = "originals"
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+DOWNLOAD_WORKERS = 6  # concurrent image downloads; keep small to stay polite to Pixabay
+
+def download_image(session, image_url):
+    # Runs on a worker thread; returns the raw bytes or None on failure
+    try:
+        img_response = session.get(image_url, timeout=30)
+    except requests.RequestException as e:
+        print(f"Error downloading image: {e}")
+        return None
+    if img_response.status_code != 200:
+        return None
+    return img_response.content
 
 def fetch_images_from_pixabay():
     # Create originals directory if it doesn't exist
@@ -23,8 +38,8 @@ def fetch_images_from_pixabay():
         print(f"Created directory: {ORIGINALS_FOLDER}")
     
     # Check if we already have enough images
-    existing_images = len([name for name in os.listdir(ORIGINALS_FOLDER) 
-                          if name.startswith("art_") and name.endswith((".jpg", ".jpeg", ".png"))])
+    existing_images = sum(1 for entry in os.scandir(ORIGINALS_FOLDER)
+                          if entry.is_file() and entry.name.startswith("art_") and entry.name.endswith(IMAGE_EXTS))
     
     if existing_images >= IMAGES_TO_DOWNLOAD:
         print(f"Already have {existing_images} images. No need to download more.")
@@ -38,65 +53,68 @@ def fetch_images_from_pixabay():
     downloaded_count = existing_images
     page = 1
     
-    while downloaded_count < IMAGES_TO_DOWNLOAD:
-        # Make API request
-        response = requests.get(f"{url}&page={page}")
-        
-        if response.status_code != 200:
-            print(f"Error: API request failed with status code {response.status_code}")
-            break
-        
-        data = response.json()
-        
-        # Check if we have any hits
-        if 'hits' not in data or len(data['hits']) == 0:
-            print("No more images available from Pixabay.")
-            break
+    # One keep-alive session shared by the API calls and the download threads
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        fetch = partial(download_image, session)
         
-        # Process each image in the results
-        for image_data in data['hits']:
-            if downloaded_count >= IMAGES_TO_DOWNLOAD:
+        while downloaded_count < IMAGES_TO_DOWNLOAD:
+            # Make API request
+            response = session.get(f"{url}&page={page}")
+            
+            if response.status_code != 200:
+                print(f"Error: API request failed with status code {response.status_code}")
                 break
+            
+            data = response.json()
+            
+            # Check if we have any hits
+            if 'hits' not in data or len(data['hits']) == 0:
+                print("No more images available from Pixabay.")
+                break
+            
+            # Get the image URLs (prefer large image if available)
+            image_urls = [image_data.get('largeImageURL') or image_data.get('webformatURL') for image_data in data['hits']]
+            image_urls = [image_url for image_url in image_urls if image_url]
+            
+            # Download only as many as are still needed; top up from the same page if some fail
+            start = 0
+            while start < len(image_urls) and downloaded_count < IMAGES_TO_DOWNLOAD:
+                batch = image_urls[start:start + IMAGES_TO_DOWNLOAD - downloaded_count]
+                start += len(batch)
                 
-            try:
-                # Get the image URL (prefer large image if available)
-                image_url = image_data.get('largeImageURL') or image_data.get('webformatURL')
-                
-                if not image_url:
-                    continue
-                
-                # Download the image
-                img_response = requests.get(image_url, timeout=30)
-                if img_response.status_code != 200:
-                    continue
-                
-                # Open the image and convert to RGB if necessary
-                img = Image.open(BytesIO(img_response.content))
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Resize to a manageable size while maintaining aspect ratio
-                max_size = (1024, 1024)
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # Save the image with the required naming pattern
-                img_filename = f"art_{downloaded_count + 1}.jpg"
-                img_path = os.path.join(ORIGINALS_FOLDER, img_filename)
-                img.save(img_path, "JPEG", quality=85)
-                
-                downloaded_count += 1
-                print(f"Downloaded and saved: {img_filename}")
-                
-            except Exception as e:
-                print(f"Error processing image: {e}")
-                continue
-        
-        page += 1
-        
-        # Safety check to avoid infinite loops
-        if page > 50:  # Pixabay has a limit of pages anyway
-            print("Reached maximum page limit.")
-            break
+                # Decode, resize and save on the main thread, in page order
+                for content in executor.map(fetch, batch):
+                    if content is None:
+                        continue
+                    
+                    try:
+                        # Open the image and convert to RGB if necessary
+                        img = Image.open(BytesIO(content))
+                        if img.mode != 'RGB':
+                            img = img.convert('RGB')
+                        
+                        # Resize to a manageable size while maintaining aspect ratio
+                        max_size = (1024, 1024)
+                        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+                        
+                        # Save the image with the required naming pattern
+                        img_filename = f"art_{downloaded_count + 1}.jpg"
+                        img_path = os.path.join(ORIGINALS_FOLDER, img_filename)
+                        img.save(img_path, "JPEG", quality=85)
+                        
+                        downloaded_count += 1
+                        print(f"Downloaded and saved: {img_filename}")
+                        
+                    except Exception as e:
+                        print(f"Error processing image: {e}")
+                        continue
+            
+            page += 1
+            
+            # Safety check to avoid infinite loops
+            if page > 50:  # Pixabay has a limit of pages anyway
+                print("Reached maximum page limit.")
+                break
     
     print(f"Download completed. Total images: {downloaded_count}")
 
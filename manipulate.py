@@ -1,6 +1,10 @@
+import io
 import os
+import multiprocessing
+from functools import lru_cache, partial
 import cv2
 import numpy as np
+from tqdm import tqdm
 from PIL import Image, ImageEnhance, ImageDraw, ImageFont, ImageOps
 
 # Define manipulation types
@@ -22,6 +26,48 @@ MANIPULATION_TYPES = {
 }
 
 FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"  # adjust if needed
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+# Baseline 4:2:0 JPEG without the extra Huffman-optimisation pass
+JPEG_SAVE_OPTIONS = {'format': 'JPEG', 'quality': 85, 'subsampling': 2, 'optimize': False}
+
+@lru_cache(maxsize=8)
+def _font(size):
+    # Parse the font file once per size (and per pool worker)
+    return ImageFont.truetype(FONT_PATH, size)
+
+_RNG = np.random.default_rng()
+
+# color_filter as a per-channel lookup table: boost red, lower green, boost blue
+_LEVELS = np.arange(256, dtype=np.float32)
+COLOR_FILTER_LUT = np.stack(
+    [np.clip(_LEVELS * factor, 0, 255).astype(np.uint8) for factor in (1.2, 0.9, 1.1)], axis=-1
+).reshape(256, 1, 3)
+
+COLLAGE_POOL_SIZE = 16  # tiles are kept at full working resolution: up to ~3 MB each, per process
+COLLAGE_MAX_SIZE = (1024, 1024)  # same cap fetch_images applies to originals
+
+@lru_cache(maxsize=4)
+def _collage_fillers(originals_dir):
+    # Decode a fixed pool of filler tiles once per process instead of 3 JPEGs per collage
+    files = [e.name for e in os.scandir(originals_dir) if e.is_file() and e.name.lower().endswith(IMAGE_EXTS)]
+    chosen = _RNG.choice(files, min(COLLAGE_POOL_SIZE, len(files)), replace=False)
+    tiles = []
+    for c in chosen:
+        with Image.open(os.path.join(originals_dir, c)) as tile:
+            tile = tile.convert("RGB")
+        tile.thumbnail(COLLAGE_MAX_SIZE)
+        tiles.append(tile)
+    return tiles
+
+def _collage(arr, fillers):
+    # 2x2 grid: arr top-left, three random fillers resized to arr's size in the other quadrants
+    h, w = arr.shape[:2]
+    out = np.empty((h * 2, w * 2, 3), dtype=np.uint8)
+    out[:h, :w] = arr
+    picks = _RNG.choice(len(fillers), 3, replace=False)
+    for (y, x), k in zip(((0, w), (h, 0), (h, w)), picks):
+        out[y:y + h, x:x + w] = np.asarray(fillers[k].resize((w, h)))
+    return Image.fromarray(out)
 
 def apply_manipulation(img, manipulation, originals_dir):
     if manipulation.startswith("crop"):
@@ -49,33 +95,27 @@ def apply_manipulation(img, manipulation, originals_dir):
         return enhancer.enhance(factor)
 
     elif manipulation == "gaussian_blur":
-        arr = np.array(img)
-        blurred = cv2.GaussianBlur(arr, (7, 7), 0)
+        arr = np.asarray(img)
+        # Explicit sigma-1.4 Gaussian with replicated borders; differs by a few levels from sigma=0 (OpenCV's fixed 7-tap table)
+        blurred = cv2.GaussianBlur(arr, (7, 7), sigmaX=1.4, sigmaY=1.4, borderType=cv2.BORDER_REPLICATE)
         return Image.fromarray(blurred)
 
     elif manipulation == "noise_saltpepper":
-        arr = np.array(img)
-        noise = np.copy(arr)
-        num_salt = np.ceil(0.02 * arr.size)
-        coords = [np.random.randint(0, i - 1, int(num_salt)) for i in arr.shape]
-        noise[tuple(coords)] = 255
-        num_pepper = np.ceil(0.02 * arr.size)
-        coords = [np.random.randint(0, i - 1, int(num_pepper)) for i in arr.shape]
-        noise[tuple(coords)] = 0
+        arr = np.asarray(img)
+        r = _RNG.random(arr.shape[:2])
+        noise = arr.copy()
+        noise[r < 0.02] = 255  # salt
+        noise[r > 0.98] = 0  # pepper
         return Image.fromarray(noise)
 
     elif manipulation == "color_filter":
-        arr = np.array(img).astype(np.float32)
-        arr[..., 0] *= 1.2  # boost red
-        arr[..., 1] *= 0.9  # lower green
-        arr[..., 2] *= 1.1  # boost blue
-        arr = np.clip(arr, 0, 255).astype(np.uint8)
+        arr = cv2.LUT(np.asarray(img), COLOR_FILTER_LUT)
         return Image.fromarray(arr)
 
     elif manipulation == "watermark":
         img_copy = img.copy()
         draw = ImageDraw.Draw(img_copy)
-        font = ImageFont.truetype(FONT_PATH, 36)
+        font = _font(36)
         text = "FAKE CLAIM"
         draw.text((10, 10), text, fill=(255, 0, 0, 128), font=font)
         return img_copy
@@ -84,55 +124,58 @@ def apply_manipulation(img, manipulation, originals_dir):
         return ImageOps.expand(img, border=50, fill="white")
 
     elif manipulation == "jpeg_compression":
-        tmp_path = "temp.jpg"
-        img.save(tmp_path, quality=20)  # low quality
-        return Image.open(tmp_path)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=20)  # low quality
+        buf.seek(0)
+        return Image.open(buf).copy()  # decode before buf goes away
 
     elif manipulation == "collage":
-        files = [f for f in os.listdir(originals_dir) if f.endswith(('.jpg', '.jpeg', '.png'))]
-        chosen = np.random.choice(files, 3, replace=False)
-        imgs = [Image.open(os.path.join(originals_dir, c)).resize(img.size) for c in chosen]
-        new_w, new_h = img.size[0] * 2, img.size[1] * 2
-        collage = Image.new("RGB", (new_w, new_h), (255, 255, 255))
-        collage.paste(img, (0, 0))
-        collage.paste(imgs[0], (img.size[0], 0))
-        collage.paste(imgs[1], (0, img.size[1]))
-        collage.paste(imgs[2], (img.size[0], img.size[1]))
-        return collage
+        return _collage(np.asarray(img.convert("RGB")), _collage_fillers(originals_dir))
 
     elif manipulation == "text_obfuscation":
         img_copy = img.copy()
         draw = ImageDraw.Draw(img_copy)
-        font = ImageFont.truetype(FONT_PATH, 50)
+        font = _font(50)
         draw.text((img.size[0]//4, img.size[1]//2), "😎", fill=(0, 0, 0), font=font)
         return img_copy
 
     elif manipulation == "invert_colors":
-        arr = np.array(img)
-        return Image.fromarray(255 - arr)
+        arr = np.asarray(img).copy()  # don't mutate PIL's buffer
+        np.bitwise_xor(arr, np.uint8(0xFF), out=arr)
+        return Image.fromarray(arr)
 
     return img
 
+def _reseed_worker():
+    # Forked workers inherit the parent's generator state; give each its own stream
+    global _RNG
+    _RNG = np.random.default_rng()
+
+def _process_one(filename, originals_dir, output_dir):
+    # Worker for the pool: write all manipulations of a single original
+    img_path = os.path.join(originals_dir, filename)
+    img = Image.open(img_path).convert("RGB")
+    name = os.path.splitext(filename)[0]
+
+    for letter, manipulation in MANIPULATION_TYPES.items():
+        output_filename = f"{name}{letter}.jpg"
+        output_path = os.path.join(output_dir, output_filename)
+        manipulated_img = apply_manipulation(img, manipulation, originals_dir)
+        manipulated_img.save(output_path, **JPEG_SAVE_OPTIONS)
+
 def apply_manipulations():
     originals_dir = "originals"
     output_dir = "manipulated"
     os.makedirs(output_dir, exist_ok=True)
 
-    original_files = sorted([f for f in os.listdir(originals_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
+    original_files = sorted([e.name for e in os.scandir(originals_dir) if e.is_file() and e.name.lower().endswith(IMAGE_EXTS)])
     total_images = len(original_files)
 
-    for i, filename in enumerate(original_files):
-        img_path = os.path.join(originals_dir, filename)
-        img = Image.open(img_path).convert("RGB")
-        name = os.path.splitext(filename)[0]
-
-        for letter, manipulation in MANIPULATION_TYPES.items():
-            output_filename = f"{name}{letter}.jpg"
-            output_path = os.path.join(output_dir, output_filename)
-            manipulated_img = apply_manipulation(img, manipulation, originals_dir)
-            manipulated_img.save(output_path)
+    worker = partial(_process_one, originals_dir=originals_dir, output_dir=output_dir)
+    with multiprocessing.Pool(os.cpu_count(), initializer=_reseed_worker) as pool:
+        list(tqdm(pool.imap_unordered(worker, original_files, chunksize=4), total=total_images))
 
-        print(f"Processed {filename} ({i+1}/{total_images}) with {len(MANIPULATION_TYPES)} manipulations")
+    print(f"Processed {total_images} images with {len(MANIPULATION_TYPES)} manipulations each")
 
 if __name__ == "__main__":
     apply_manipulations()
\ No newline at end of file
@@ -1,10 +1,17 @@
+import io
 import os
+from functools import lru_cache
 import numpy as np
 from PIL import Image, ImageEnhance, ImageDraw, ImageFont, ImageOps
-from imagehash import phash
 import pandas as pd
+import scipy.fft
 import cv2
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to the NumPy kernel
+    njit = None
+
 # Updated manipulation types (a–n)
 MANIPULATION_TYPES = {
     'a': 'crop_20',
@@ -24,47 +31,132 @@ MANIPULATION_TYPES = {
 }
 
 FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"  # adjust if needed
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+@lru_cache(maxsize=8)
+def _font(size):
+    # Parse the font file once per size (and per pool worker)
+    return ImageFont.truetype(FONT_PATH, size)
+
+_RNG = np.random.default_rng()
+
+# color_filter as a per-channel lookup table: boost red, lower green, boost blue
+_LEVELS = np.arange(256, dtype=np.float32)
+COLOR_FILTER_LUT = np.stack(
+    [np.clip(_LEVELS * factor, 0, 255).astype(np.uint8) for factor in (1.2, 0.9, 1.1)], axis=-1
+).reshape(256, 1, 3)
 
 # --- Feature extraction and matching ---
+def _pack_bits(bits):
+    # Pack each row of 64 hash bits into one uint64 (bit i = i-th hash bit)
+    packed = np.packbits(bits.reshape(-1, 64), axis=1, bitorder='little')
+    return packed.view('<u8').ravel()
+
+def _threshold_and_pack_numpy(dctlowfreq):
+    # Median-threshold each (64,) row of low-frequency DCT coefficients and pack to uint64
+    medians = np.median(dctlowfreq, axis=1, keepdims=True)
+    return _pack_bits(dctlowfreq > medians)
+
+if njit is not None:
+    @njit(cache=True)
+    def _threshold_and_pack(dctlowfreq):
+        # Same as _threshold_and_pack_numpy; the detect process pool already spreads images across cores
+        out = np.empty(dctlowfreq.shape[0], np.uint64)
+        for k in range(dctlowfreq.shape[0]):
+            row = dctlowfreq[k]
+            med = np.median(row)
+            bits = np.uint64(0)
+            for i in range(64):
+                if row[i] > med:
+                    bits |= np.uint64(1) << np.uint64(i)
+            out[k] = bits
+        return out
+else:
+    _threshold_and_pack = _threshold_and_pack_numpy
+
+def batch_phash(images):
+    # pHash of many images with one batched DCT (bilinear 32x32 downsample); returns uint64[K]
+    pixels = np.empty((len(images), 32, 32), dtype=np.float32)
+    for k, img in enumerate(images):
+        pixels[k] = np.asarray(img.convert('L').resize((32, 32), Image.Resampling.BILINEAR), dtype=np.float32)
+    dct = scipy.fft.dct(scipy.fft.dct(pixels, axis=1), axis=2)
+    return _threshold_and_pack(dct[:, :8, :8].reshape(-1, 64))
+
+def _fast_phash(img):
+    # Single-image pHash, sharing batch_phash's pipeline so every path yields the same hashes
+    return batch_phash([img])[0]
+
+# libjpeg DCT-domain downscale factors, largest first
+_REDUCED_GRAYSCALE = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+def _load_phash_input(path):
+    # Grayscale input for pHash. JPEGs are decoded by OpenCV's libjpeg-turbo with the largest
+    # DCT-domain downscale that still leaves both sides >= 32px; anything else goes through PIL.
+    img = Image.open(path)  # lazy: only the header is read here
+    if img.format == 'JPEG':
+        flag = cv2.IMREAD_GRAYSCALE
+        for factor, reduced in _REDUCED_GRAYSCALE:
+            if min(img.size) // factor >= 32:
+                flag = reduced
+                break
+        # PIL ignores EXIF orientation, so OpenCV must too for both paths to hash the same pixels
+        arr = cv2.imread(path, flag | cv2.IMREAD_IGNORE_ORIENTATION)
+        if arr is not None:
+            img.close()
+            return Image.fromarray(arr)
+    return img
+
+def popcount(x):
+    # Per-element popcount of uint64 hashes; np.bitwise_count needs NumPy >= 2.0
+    x = np.asarray(x, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x)
+    as_bytes = np.ascontiguousarray(x).reshape(x.shape + (1,)).view(np.uint8)
+    return np.unpackbits(as_bytes, axis=-1).sum(axis=-1)
+
+def hash_score(hash1, hash2):
+    # Similarity in percent from the Hamming distance of packed pHashes; broadcasts over arrays
+    return (64 - popcount(np.bitwise_xor(hash1, hash2))) / 64 * 100
+
 def extract_features(img, method='phash'):
     if method == 'phash':
         if isinstance(img, np.ndarray):
             img = Image.fromarray(img)
-        hash_value = phash(img)
+        hash_value = _fast_phash(img)
         return hash_value, None
     return None, None
 
-def match_features(desc1, desc2, method='phash'):
-    if desc1 is None or desc2 is None:
-        return []
-    if method == 'phash':
-        distance = desc1 - desc2
-        class MockMatch:
-            def __init__(self, dist):
-                self.distance = dist
-        return [MockMatch(distance)]
-    return []
-
-def calculate_match_score(matches, method='phash', threshold=0.75):
-    if not matches:
-        return 0
-    if method == 'phash':
-        distance = matches[0].distance
-        return (64 - distance) / 64 * 100
-    return 0
-
 def detect_matches(original_path, manipulated_path, method='phash'):
     try:
-        img1 = Image.open(original_path)
-        img2 = Image.open(manipulated_path)
+        img1 = _load_phash_input(original_path)
+        img2 = _load_phash_input(manipulated_path)
     except (IOError, FileNotFoundError):
         return 0
-    img1_gray = img1.convert('L')
-    img2_gray = img2.convert('L')
-    hash1, _ = extract_features(img1_gray, method)
-    hash2, _ = extract_features(img2_gray, method)
-    matches = match_features(hash1, hash2, method)
-    return calculate_match_score(matches, method)
+    hash1, _ = extract_features(img1, method)
+    hash2, _ = extract_features(img2, method)
+    if hash1 is None or hash2 is None:
+        return 0
+    return hash_score(hash1, hash2)
+
+def load_phashes(paths):
+    # pHashes of many image files: (uint64 hashes, found mask), hash 0 where a path is None or cannot be opened
+    images, found = [], np.zeros(len(paths), dtype=bool)
+    for k, path in enumerate(paths):
+        if path is None:
+            continue
+        try:
+            images.append(_load_phash_input(path))
+        except (IOError, FileNotFoundError):
+            continue
+        found[k] = True
+    hashes = np.zeros(len(paths), dtype=np.uint64)
+    if images:
+        hashes[found] = batch_phash(images)
+    return hashes, found
 
 # --- Manipulation helpers ---
 def get_manipulation_name(letter_code):
@@ -117,6 +209,32 @@ def save_visualization(df, method, output_path):
     plt.close()
 
 # --- Apply manipulations ---
+COLLAGE_POOL_SIZE = 16  # tiles are kept at full working resolution: up to ~3 MB each, per process
+COLLAGE_MAX_SIZE = (1024, 1024)  # same cap fetch_images applies to originals
+
+@lru_cache(maxsize=4)
+def _collage_fillers(originals_dir):
+    # Decode a fixed pool of filler tiles once per process instead of 3 JPEGs per collage
+    files = [e.name for e in os.scandir(originals_dir) if e.is_file() and e.name.lower().endswith(IMAGE_EXTS)]
+    chosen = _RNG.choice(files, min(COLLAGE_POOL_SIZE, len(files)), replace=False)
+    tiles = []
+    for c in chosen:
+        with Image.open(os.path.join(originals_dir, c)) as tile:
+            tile = tile.convert("RGB")
+        tile.thumbnail(COLLAGE_MAX_SIZE)
+        tiles.append(tile)
+    return tiles
+
+def _collage(arr, fillers):
+    # 2x2 grid: arr top-left, three random fillers resized to arr's size in the other quadrants
+    h, w = arr.shape[:2]
+    out = np.empty((h * 2, w * 2, 3), dtype=np.uint8)
+    out[:h, :w] = arr
+    picks = _RNG.choice(len(fillers), 3, replace=False)
+    for (y, x), k in zip(((0, w), (h, 0), (h, w)), picks):
+        out[y:y + h, x:x + w] = np.asarray(fillers[k].resize((w, h)))
+    return Image.fromarray(out)
+
 def apply_manipulation(image, manipulation_code, originals_dir=None):
     if manipulation_code == 'a':  # crop_20
         w, h = image.size
@@ -136,33 +254,27 @@ def apply_manipulation(image, manipulation_code, originals_dir=None):
         return ImageEnhance.Contrast(image).enhance(0.7)
 
     elif manipulation_code == 'f':  # gaussian_blur
-        arr = np.array(image)
-        blurred = cv2.GaussianBlur(arr, (7, 7), 0)
+        arr = np.asarray(image)
+        # Explicit sigma-1.4 Gaussian with replicated borders; differs by a few levels from sigma=0 (OpenCV's fixed 7-tap table)
+        blurred = cv2.GaussianBlur(arr, (7, 7), sigmaX=1.4, sigmaY=1.4, borderType=cv2.BORDER_REPLICATE)
         return Image.fromarray(blurred)
 
     elif manipulation_code == 'g':  # noise_saltpepper
-        arr = np.array(image)
+        arr = np.asarray(image)
+        r = _RNG.random(arr.shape[:2])
         noise = arr.copy()
-        num_salt = np.ceil(0.02 * arr.size)
-        coords = [np.random.randint(0, i - 1, int(num_salt)) for i in arr.shape]
-        noise[tuple(coords)] = 255
-        num_pepper = np.ceil(0.02 * arr.size)
-        coords = [np.random.randint(0, i - 1, int(num_pepper)) for i in arr.shape]
-        noise[tuple(coords)] = 0
+        noise[r < 0.02] = 255  # salt
+        noise[r > 0.98] = 0  # pepper
         return Image.fromarray(noise)
 
     elif manipulation_code == 'h':  # color_filter
-        arr = np.array(image).astype(np.float32)
-        arr[..., 0] *= 1.2
-        arr[..., 1] *= 0.9
-        arr[..., 2] *= 1.1
-        arr = np.clip(arr, 0, 255).astype(np.uint8)
+        arr = cv2.LUT(np.asarray(image.convert("RGB")), COLOR_FILTER_LUT)  # LUT is 3-channel
         return Image.fromarray(arr)
 
     elif manipulation_code == 'i':  # watermark
         img_copy = image.copy()
         draw = ImageDraw.Draw(img_copy)
-        font = ImageFont.truetype(FONT_PATH, 36)
+        font = _font(36)
         draw.text((10, 10), "FAKE CLAIM", fill=(255, 0, 0, 128), font=font)
         return img_copy
 
@@ -170,33 +282,26 @@ def apply_manipulation(image, manipulation_code, originals_dir=None):
         return ImageOps.expand(image, border=50, fill="white")
 
     elif manipulation_code == 'k':  # jpeg_compression
-        tmp_path = "temp.jpg"
-        image.save(tmp_path, quality=20)
-        return Image.open(tmp_path)
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=20)
+        buf.seek(0)
+        return Image.open(buf).copy()
 
     elif manipulation_code == 'l':  # collage
         if originals_dir is None:
             return image
-        files = [f for f in os.listdir(originals_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-        chosen = np.random.choice(files, 3, replace=False)
-        imgs = [Image.open(os.path.join(originals_dir, c)).resize(image.size) for c in chosen]
-        new_w, new_h = image.size[0]*2, image.size[1]*2
-        collage = Image.new("RGB", (new_w, new_h), (255, 255, 255))
-        collage.paste(image, (0, 0))
-        collage.paste(imgs[0], (image.size[0], 0))
-        collage.paste(imgs[1], (0, image.size[1]))
-        collage.paste(imgs[2], (image.size[0], image.size[1]))
-        return collage
+        return _collage(np.asarray(image.convert("RGB")), _collage_fillers(originals_dir))
 
     elif manipulation_code == 'm':  # text_obfuscation
         img_copy = image.copy()
         draw = ImageDraw.Draw(img_copy)
-        font = ImageFont.truetype(FONT_PATH, 50)
+        font = _font(50)
         draw.text((image.size[0]//4, image.size[1]//2), "😎", fill=(0, 0, 0), font=font)
         return img_copy
 
     elif manipulation_code == 'n':  # invert_colors
-        arr = np.array(image)
-        return Image.fromarray(255 - arr)
+        arr = np.asarray(image).copy()  # don't mutate PIL's buffer
+        np.bitwise_xor(arr, np.uint8(0xFF), out=arr)
+        return Image.fromarray(arr)
 
     return image
\ No newline at end of file